@@ -1,40 +1,93 @@
+from typing import List, Tuple
+
 import streamlit as st
 
 from music_recommender.recommender import Recommender
 
 
+@st.cache_resource
+def get_recommender() -> Recommender:
+    """
+    Get the Recommender instance shared across Streamlit reruns.
+
+    Returns:
+    - Recommender: Recommender with data loaded and similarities prepared.
+    """
+    return Recommender()
+
+
+@st.cache_data(show_spinner=False)
+def get_item_based_recommendations(selected_artists: Tuple[str, ...]) -> List[str]:
+    """
+    Get item-based artist recommendations cached across Streamlit reruns.
+
+    Parameters:
+    - selected_artists (Tuple[str, ...]): Sorted tuple of artists selected by the user.
+
+    Returns:
+    - List[str]: List of recommended artists.
+    """
+    return get_recommender().get_item_based_recommendations(list(selected_artists))
+
+
+@st.cache_data(show_spinner=False)
+def get_user_based_recommendations(selected_artists: Tuple[str, ...]) -> List[str]:
+    """
+    Get user-based artist recommendations cached across Streamlit reruns.
+
+    Parameters:
+    - selected_artists (Tuple[str, ...]): Sorted tuple of artists selected by the user.
+
+    Returns:
+    - List[str]: List of recommended artists based on user behavior.
+    """
+    return get_recommender().get_user_based_recommendations(list(selected_artists))
+
+
+@st.cache_data(show_spinner=False)
+def get_tracks_to_select() -> Tuple[str, ...]:
+    """
+    Get tracks offered for selection, one per artist, cached across Streamlit reruns.
+
+    Returns:
+    - Tuple[str, ...]: Full names of the tracks to select from.
+    """
+    tracklist = get_recommender().tracklist
+    return tuple(
+        tracklist.groupby("artist_name", observed=True)["full_name"].first().unique()
+    )
+
+
 def main():
     # Streamlit UI
     st.title('Рекомендательная система "Интернет-магазин музыки"')
 
-    # Instantiate the Recommender class
-    recommender = Recommender()
+    # Get the cached Recommender instance
+    recommender = get_recommender()
 
-    tracks_to_select = (
-        recommender.tracklist.groupby("artist_name")["full_name"].first().unique()
-    )
     # Select tracks from the multiselect dropdown
     selected_tracks = st.multiselect(
         "Выберите свои любимые песни:",
-        tracks_to_select,
+        get_tracks_to_select(),
     )
 
     # Button to get recommendations
     if st.button("Получить рекомендации по артистам"):
         # Extract selected artists from the tracklist
-        selected_artists = recommender.tracklist[
-            recommender.tracklist["full_name"].isin(selected_tracks)
-        ]["artist_name"].tolist()
+        selected_artists = recommender.get_track_artists(selected_tracks)
 
         # Get recommendations using the Recommender class methods
         popular_artist_recommendations = (
             recommender.get_popular_artist_recommendations()
         )
-        item_based_recommendations = recommender.get_item_based_recommendations(
-            selected_artists
+        # Sort selected artists so the same selection always hits the same cache entry;
+        # repeated artists are kept since they add weight to the recommendations
+        selected_artists_key = tuple(sorted(selected_artists))
+        item_based_recommendations = get_item_based_recommendations(
+            selected_artists_key
         )
-        user_based_recommendations = recommender.get_user_based_recommendations(
-            selected_artists
+        user_based_recommendations = get_user_based_recommendations(
+            selected_artists_key
         )
 
         # Display recommendations in Streamlit UI
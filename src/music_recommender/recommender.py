@@ -1,33 +1,125 @@
 from typing import List, Optional
 
 import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
+from numba import njit
+from scipy.sparse import csr_matrix
+from sklearn.preprocessing import normalize
 
 from music_recommender.utils import get_data
 
 
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Get indices of the k highest scores.
+
+    Parameters:
+    - scores (np.ndarray): One-dimensional array of scores.
+    - k (int): Number of indices to return.
+
+    Returns:
+    - np.ndarray: Indices of the k highest scores, sorted by score in descending order.
+    """
+    k = min(k, scores.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    # Partition in linear time, then sort only the k selected scores
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(scores[top])[::-1]]
+
+
+@njit(fastmath=True, cache=True)
+def _aggregate_neighbor_ratings(
+    neighbors: np.ndarray,
+    similarities: np.ndarray,
+    neighbor_sums: np.ndarray,
+    average_rating: float,
+) -> np.ndarray:
+    """
+    Predict artist ratings from the ratings of the nearest users.
+
+    Centers each artist's ratings on their mean across the neighbors and sums them,
+    weighted by each neighbor's similarity over their total rating,
+    without k x M temporaries.
+
+    Parameters:
+    - neighbors (np.ndarray): Dense ratings of the nearest users, one row per user.
+    - similarities (np.ndarray): Similarity of each nearest user to the current user.
+    - neighbor_sums (np.ndarray): Total rating of each nearest user.
+    - average_rating (float): Average rating of the current user.
+
+    Returns:
+    - np.ndarray: Predicted rating for each artist.
+    """
+    n_neighbors, n_artists = neighbors.shape
+    weights = similarities / neighbor_sums
+    artist_ratings = np.empty(n_artists, dtype=np.float32)
+    for artist_idx in range(n_artists):
+        mean = 0.0
+        for user_idx in range(n_neighbors):
+            mean += neighbors[user_idx, artist_idx]
+        mean /= n_neighbors
+        rating = 0.0
+        for user_idx in range(n_neighbors):
+            rating += (neighbors[user_idx, artist_idx] - mean) * weights[user_idx]
+        artist_ratings[artist_idx] = average_rating + rating
+    return artist_ratings
+
+
 class Recommender:
     def __init__(self):
         """
         Initialize the Recommender class.
 
-        Loads data, user-artist matrix, and tracklist.
-        Computes artist similarity using cosine similarity on the user-artist matrix.
+        Loads user-artist matrix, tracklist, and artist categories,
+        which map user-artist matrix columns to artist names.
+        Caches the row-normalized user-artist matrix used for user similarity,
+        unit-length artist vectors used for artist similarity, artist popularity,
+        the popular artist recommendations for new users, and the artist of each track
+        in the tracklist.
+        """
+        (
+            self.user_artist_matrix,
+            self.tracklist,
+            self.artist_categories,
+        ) = get_data()
+        self.uam_norm = normalize(self.user_artist_matrix, norm="l2", axis=1)
+        # One row per artist, so cosine similarity between artists is a dot product
+        self.artist_vectors = normalize(self.user_artist_matrix.T, norm="l2").tocsr()
+        # Sum along axis=0 to get the total rating for each artist
+        self._artist_popularity = np.asarray(
+            self.user_artist_matrix.sum(axis=0)
+        ).ravel()
+        # Popular artists do not depend on the user, so recommend them from a cache
+        self._popular_artist_recommendations = self.artist_categories[
+            self.get_popular_artists()
+        ].tolist()
+        self._full_name_to_artist = dict(
+            zip(self.tracklist["full_name"], self.tracklist["artist_name"])
+        )
+
+    def get_track_artists(self, selected_tracks: List[str]) -> List[str]:
+        """
+        Get artists of the selected tracks.
+
+        Parameters:
+        - selected_tracks (List[str]): List of selected track full names.
+
+        Returns:
+        - List[str]: List of artists of the selected tracks.
         """
-        self.df, self.user_artist_matrix, self.tracklist = get_data()
-        self.artist_similarity = cosine_similarity(self.user_artist_matrix.T)
+        return [self._full_name_to_artist[track] for track in selected_tracks]
 
-    def get_popular_artists(self) -> List[int]:
+    def get_popular_artists(self, k: int = 10) -> List[int]:
         """
         Get popular artists based on overall ratings.
 
+        Parameters:
+        - k (int): Number of most popular artists to return.
+
         Returns:
-        - List[int]: List of artist indices sorted by popularity.
+        - List[int]: List of the k most popular artist indices sorted by popularity.
         """
-        # Sum along axis=0 to get the total rating for each artist
-        artist_popularity = self.user_artist_matrix.sum(axis=0).A1
-        popular_artists = np.argsort(artist_popularity)[::-1]
+        popular_artists = _top_k(self._artist_popularity, k)
         return popular_artists.tolist()
 
     def get_popular_artist_recommendations(self) -> List[str]:
@@ -39,22 +131,8 @@ class Recommender:
         Returns:
         - List[str]: List of recommended popular artists.
         """
-        popular_artists = self.get_popular_artists()
-
-        # If it's a new user, assume they haven't listened to any artist
-        user_artists = set()
-
-        recommended_artists = []
-        for idx in popular_artists:
-            if idx in user_artists:
-                continue
-            recommended_artists.append(
-                pd.Categorical(self.df["artist_name"]).categories[idx]
-            )
-            if len(recommended_artists) >= 10:
-                break
-
-        return recommended_artists
+        # A new user hasn't listened to any artist, so no artists need to be excluded
+        return list(self._popular_artist_recommendations)
 
     def get_item_based_recommendations(
         self,
@@ -70,25 +148,27 @@ class Recommender:
         - List[int]: List of recommended artist indices.
         """
         if selected_artists:
-            selected_artist_indices = [
-                pd.Categorical(self.df["artist_name"]).categories.get_loc(artist)
-                for artist in selected_artists
+            selected_artist_indices = self.artist_categories.get_indexer(
+                selected_artists
+            )
+            # Artists missing from the user-artist matrix are reported as -1
+            selected_artist_indices = selected_artist_indices[
+                selected_artist_indices >= 0
             ]
-            similar_scores = self.artist_similarity[selected_artist_indices].sum(axis=0)
-            similar_artists = list(enumerate(similar_scores))
-            sorted_artists = sorted(similar_artists, key=lambda x: x[1], reverse=True)
-
-            recommended_artists = []
-            for idx, _ in sorted_artists:
-                if idx in selected_artist_indices:
-                    continue
-                recommended_artists.append(
-                    pd.Categorical(self.df["artist_name"]).categories[idx]
-                )
-                if len(recommended_artists) >= 10:
-                    return recommended_artists
-
-            return recommended_artists
+            if selected_artist_indices.size == 0:
+                return []
+            # Summed similarity to the selected artists, computed only for them instead
+            # of materializing the full artist-by-artist similarity matrix
+            selected_vector = np.asarray(
+                self.artist_vectors[selected_artist_indices].sum(axis=0)
+            ).ravel()
+            similar_scores = self.artist_vectors @ selected_vector
+            # Exclude already selected artists from the recommendations
+            similar_scores[selected_artist_indices] = -np.inf
+            sorted_artists = _top_k(similar_scores, 10)
+            sorted_artists = sorted_artists[np.isfinite(similar_scores[sorted_artists])]
+
+            return self.artist_categories[sorted_artists].tolist()
         return []
 
     def get_user_based_recommendations(
@@ -105,47 +185,47 @@ class Recommender:
         - List[str]: List of recommended artists based on user behavior.
         """
         if selected_artists:
-            selected_artist_indices = [
-                pd.Categorical(self.df["artist_name"]).categories.get_loc(artist)
-                for artist in selected_artists
+            selected_artist_indices = self.artist_categories.get_indexer(
+                selected_artists
+            )
+            # Artists missing from the user-artist matrix are reported as -1
+            selected_artist_indices = selected_artist_indices[
+                selected_artist_indices >= 0
             ]
-            user_ratings = np.zeros((self.user_artist_matrix.shape[1]))
-            for artist_idx in selected_artist_indices:
-                user_ratings[artist_idx] += 1
-            user_similarity: np.ndarray = cosine_similarity(
-                user_ratings.reshape(1, -1), self.user_artist_matrix
-            )[0]
-            k_nearest_users = np.argsort(user_similarity, axis=0)[:-11:-1]
+            if selected_artist_indices.size == 0:
+                return []
+            # Build the user's ratings as a sparse row; repeated artists are summed
+            n_selected = len(selected_artist_indices)
+            user_ratings = csr_matrix(
+                (
+                    np.ones(n_selected, dtype=np.float32),
+                    (np.zeros(n_selected, dtype=np.intp), selected_artist_indices),
+                ),
+                shape=(1, self.user_artist_matrix.shape[1]),
+            )
+            # Cosine similarity is the dot product of unit-length user vectors
+            user_vector = normalize(user_ratings, norm="l2")
+            user_similarity: np.ndarray = (
+                (user_vector @ self.uam_norm.T).toarray().ravel()
+            )
+            k_nearest_users = _top_k(user_similarity, 10)
             average_user_rating = user_ratings.mean()
-            # print(average_user_rating)
-            # print(user_similarity.shape)
-            # print(self.user_artist_matrix[k_nearest_users].shape)
-            # print(self.user_artist_matrix[k_nearest_users].sum(axis=1).shape)
-            # print((
-            #     self.user_artist_matrix[k_nearest_users]
-            #     - self.user_artist_matrix[k_nearest_users].mean(axis=0)
-            # ).shape)
-            # print(user_similarity[k_nearest_users].shape)
-            artist_ratings = average_user_rating + (
-                +np.multiply(
-                    (
-                        self.user_artist_matrix[k_nearest_users]
-                        - self.user_artist_matrix[k_nearest_users].mean(axis=0)
-                    ),
-                    user_similarity[k_nearest_users][:, None],
-                )
-                / self.user_artist_matrix[k_nearest_users].sum(axis=1)
-            ).sum(axis=0)
-            artist_ratings = np.ravel(artist_ratings)
-            sorted_artist_ratings = np.argsort(artist_ratings)[::-1]
+            # Extract the nearest users' ratings once; a dense k x M block is small
+            neighbors = self.user_artist_matrix[k_nearest_users].toarray()
+            artist_ratings = _aggregate_neighbor_ratings(
+                neighbors,
+                user_similarity[k_nearest_users],
+                neighbors.sum(axis=1),
+                average_user_rating,
+            )
+            user_artists = set(selected_artist_indices)
+            # Selected artists are skipped below, so take enough candidates to cover them
+            sorted_artist_ratings = _top_k(artist_ratings, 10 + len(user_artists))
 
             recommended_artists = []
-            user_artists = set(selected_artist_indices)
             for artist_idx in sorted_artist_ratings:
                 if artist_idx not in user_artists:
-                    recommended_artists.append(
-                        pd.Categorical(self.df["artist_name"]).categories[artist_idx]
-                    )
+                    recommended_artists.append(self.artist_categories[artist_idx])
                     if len(recommended_artists) >= 10:
                         return recommended_artists
 
@@ -2,9 +2,15 @@ import os
 import re
 from typing import Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv
 from scipy.sparse import csr_matrix, load_npz, save_npz
 
+# Characters stripped from artist and track names when matching similar tracks
+NON_ALPHANUMERIC = re.compile("[^A-Za-z0-9äöüÄÖÜß]+")
+
 
 def remove_similar_tracks(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -16,26 +22,29 @@ def remove_similar_tracks(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
     - pd.DataFrame: DataFrame with similar tracks removed.
     """
-    # Convert track names to lowercase and remove non-alphanumeric characters
-    df["artist_name_small"] = df["artist_name"].str.lower()
-    df["artist_name_small"] = df["artist_name_small"].apply(
-        lambda x: re.sub("[^A-Za-z0-9äöüÄÖÜß]+", "", x)
+    # Convert names to lowercase, remove non-alphanumeric characters, and join them
+    # into a single key identifying similar tracks
+    artist_key = (
+        df["artist_name"].str.lower().str.replace(NON_ALPHANUMERIC, "", regex=True)
     )
-
-    df["track_name_small"] = df["track_name"].str.lower()
-    df["track_name_small"] = df["track_name_small"].apply(
-        lambda x: re.sub("[^A-Za-z0-9äöüÄÖÜß]+", "", x)
+    track_key = (
+        df["track_name"].str.lower().str.replace(NON_ALPHANUMERIC, "", regex=True)
+    )
+    key = artist_key.str.cat(track_key, sep="\x1f").to_numpy()
+
+    # Count occurrences of each track; observed=True keeps categorical keys from
+    # expanding the groups to every combination of categories
+    count = df.groupby(["artist_name", "track_name"], observed=True).transform("size")
+    # Position of the most frequent spelling within each group of similar tracks:
+    # after a stable sort by count, it is the first row of each group
+    order = np.argsort(-count.to_numpy(), kind="stable")
+    first = pd.Series(order).groupby(key[order], sort=False).transform("first")
+    positions = np.empty_like(order)
+    positions[order] = first.to_numpy()
+    return df.assign(
+        artist_name=df["artist_name"].to_numpy()[positions],
+        track_name=df["track_name"].to_numpy()[positions],
     )
-
-    # Count occurrences of each track
-    df["count"] = df.groupby(["artist_name", "track_name"]).transform("size")
-    # Sort by count in descending order
-    df = df.sort_values(by="count", ascending=False)
-    df[["artist_name", "track_name"]] = df.groupby(
-        ["artist_name_small", "track_name_small"]
-    )[["artist_name", "track_name"]].transform("first")
-    df = df.sort_index()
-    return df
 
 
 def remove_unpopular_artists(df: pd.DataFrame) -> pd.DataFrame:
@@ -49,7 +58,8 @@ def remove_unpopular_artists(df: pd.DataFrame) -> pd.DataFrame:
     - pd.DataFrame: DataFrame with unpopular artists removed.
     """
     # Filter out artists with less than 1000 occurrences
-    return df[df.groupby("artist_name").transform("size") > 100]
+    artist_counts = df["artist_name"].value_counts()
+    return df[df["artist_name"].isin(artist_counts.index[artist_counts > 100])]
 
 
 def remove_inactive_users(df: pd.DataFrame) -> pd.DataFrame:
@@ -63,7 +73,8 @@ def remove_inactive_users(df: pd.DataFrame) -> pd.DataFrame:
     - pd.DataFrame: DataFrame with inactive users removed.
     """
     # Filter out users with fewer than 500 unique tracks in their playlists
-    return df[df.groupby("user_id")["track_name"].transform("nunique") > 100]
+    user_tracks = df.groupby("user_id", observed=True)["track_name"].nunique()
+    return df[df["user_id"].isin(user_tracks.index[user_tracks > 100])]
 
 
 def remove_uniform_playlists(df: pd.DataFrame) -> pd.DataFrame:
@@ -77,7 +88,10 @@ def remove_uniform_playlists(df: pd.DataFrame) -> pd.DataFrame:
     - pd.DataFrame: DataFrame with playlists having more than 10 unique artists.
     """
     # Filter out playlists with fewer than 10 unique artists
-    return df[df.groupby("playlist_name")["artist_name"].transform("nunique") > 10]
+    playlist_artists = df.groupby("playlist_name", observed=True)[
+        "artist_name"
+    ].nunique()
+    return df[df["playlist_name"].isin(playlist_artists.index[playlist_artists > 10])]
 
 
 def get_tracklist(df: pd.DataFrame) -> pd.DataFrame:
@@ -99,28 +113,31 @@ def get_tracklist(df: pd.DataFrame) -> pd.DataFrame:
     )
     # Concatenate artist_name and track_name to create a full_name column
     tracklist["full_name"] = tracklist["artist_name"] + " - " + tracklist["track_name"]
-    return tracklist
+    # Store repeated names as categorical, so grouping and unique values work on codes
+    return tracklist.astype({"artist_name": "category", "full_name": "category"})
 
 
-def generate_data() -> Tuple[pd.DataFrame, csr_matrix, pd.DataFrame]:
+def generate_data() -> Tuple[csr_matrix, pd.DataFrame, pd.Index]:
     """
-    Generate processed data, user-artist matrix, and tracklist.
+    Generate user-artist matrix, tracklist, and artists.
 
     Returns:
-    - Tuple[pd.DataFrame, csr_matrix, pd.DataFrame]: Processed data, user-artist matrix, and tracklist.
-    """
-    # Read the Spotify dataset, drop duplicates and NaN values
-    big_data = (
-        pd.read_csv(
-            "./data/spotify_dataset.csv",
-            on_bad_lines="skip",
-            names=["user_id", "artist_name", "track_name", "playlist_name"],
-            header=None,
-            skiprows=[0],
-        )
-        .dropna()
-        .drop_duplicates()
+    - Tuple[csr_matrix, pd.DataFrame, pd.Index]: User-artist matrix, tracklist,
+      and artist names in user-artist matrix column order.
+    """
+    # Read the Spotify dataset with PyArrow's multi-threaded parser, skipping bad lines
+    columns = ["user_id", "artist_name", "track_name", "playlist_name"]
+    table = csv.read_csv(
+        "./data/spotify_dataset.csv",
+        read_options=csv.ReadOptions(column_names=columns, skip_rows=1),
+        parse_options=csv.ParseOptions(invalid_row_handler=lambda row: "skip"),
+        convert_options=csv.ConvertOptions(
+            column_types={column: pa.string() for column in columns},
+            strings_can_be_null=True,
+        ),
     )
+    # Drop duplicates and NaN values
+    big_data = table.to_pandas().dropna().drop_duplicates()
     # Remove similar tracks, unpopular artists, inactive users, and uniform playlists
     data = remove_similar_tracks(big_data)
     data = remove_unpopular_artists(data)
@@ -131,59 +148,61 @@ def generate_data() -> Tuple[pd.DataFrame, csr_matrix, pd.DataFrame]:
 
     # Extract relevant columns, calculate ratings, and create user-artist matrix
     data = data[["user_id", "artist_name", "playlist_name"]].drop_duplicates()
-    data["rating"] = data.groupby(["user_id", "artist_name"])[
+    data["rating"] = data.groupby(["user_id", "artist_name"], observed=True)[
         "playlist_name"
     ].transform("count")
+    # Factorize users and artists in a single hash pass each, without sorting
+    user_codes, _ = pd.factorize(data["user_id"], sort=False)
+    artist_codes, artists = pd.factorize(data["artist_name"], sort=False)
+    # Store ratings as float32 to halve the matrix size in memory and on disk
     user_artist_matrix = csr_matrix(
-        (
-            data["rating"],
-            (
-                pd.Categorical(data["user_id"]).codes,
-                pd.Categorical(data["artist_name"]).codes,
-            ),
-        )
+        (data["rating"].to_numpy(dtype=np.float32), (user_codes, artist_codes))
     )
-    return data, user_artist_matrix, tracklist
+    return user_artist_matrix, tracklist, artists
 
 
 def save_data(
-    data: pd.DataFrame, user_artist_matrix: csr_matrix, tracklist: pd.DataFrame
+    user_artist_matrix: csr_matrix,
+    tracklist: pd.DataFrame,
+    artists: pd.Index,
 ):
     """
-    Save processed data, user-artist matrix, and tracklist to files.
+    Save user-artist matrix, tracklist, and artists to files.
 
     Parameters:
-    - data (pd.DataFrame): Processed data DataFrame.
     - user_artist_matrix (csr_matrix): User-artist matrix.
     - tracklist (pd.DataFrame): Tracklist DataFrame.
+    - artists (pd.Index): Artist names in user-artist matrix column order.
 
     Returns:
     - None
     """
-    # Save processed data to Parquet format
-    data.to_parquet("./data/processed_data.pqt")
     # Save user-artist matrix to NPZ format
     save_npz("./data/uam.npz", user_artist_matrix)
     # Save tracklist to Parquet format
     tracklist.to_parquet("./data/tracklist.pqt")
+    # Save artist names to Parquet format
+    pd.DataFrame({"artist_name": artists}).to_parquet("./data/artists.pqt")
 
 
-def get_data() -> Tuple[pd.DataFrame, csr_matrix, pd.DataFrame]:
+def get_data() -> Tuple[csr_matrix, pd.DataFrame, pd.Index]:
     """
-    Load processed data, user-artist matrix, and tracklist from files.
+    Load user-artist matrix, tracklist, and artists from files.
 
     Returns:
-    - Tuple[pd.DataFrame, csr_matrix, pd.DataFrame]: Processed data, user-artist matrix, and tracklist.
+    - Tuple[csr_matrix, pd.DataFrame, pd.Index]: User-artist matrix, tracklist,
+      and artist names in user-artist matrix column order.
     """
-    if os.path.exists("./data/processed_data.pqt"):
-        # Read processed data from Parquet format
-        df = pd.read_parquet("./data/processed_data.pqt")
+    # Artist names are saved last, so their presence means the data is complete
+    if os.path.exists("./data/artists.pqt"):
         # Load user-artist matrix from NPZ format
-        user_artist_matrix = load_npz("./data/uam.npz")
+        user_artist_matrix = load_npz("./data/uam.npz").astype(np.float32, copy=False)
         # Read tracklist from Parquet format
         tracklist = pd.read_parquet("./data/tracklist.pqt")
+        # Read artist names from Parquet format
+        artists = pd.Index(pd.read_parquet("./data/artists.pqt")["artist_name"])
     else:
-        df, user_artist_matrix, tracklist = generate_data()
-        save_data(df, user_artist_matrix, tracklist)
+        user_artist_matrix, tracklist, artists = generate_data()
+        save_data(user_artist_matrix, tracklist, artists)
 
-    return df, user_artist_matrix, tracklist
+    return user_artist_matrix, tracklist, artists